@@ -0,0 +1,44 @@
+"""Compare default JSON encoding of search results with the fast / projected / columnar paths.
+
+Usage: python benchmark_encoding.py [iterations]
+"""
+import gzip
+import json
+import sys
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models import SearchResponse
+from response_encoding import encode_json, parse_fields, shape_deals
+from store_logic import find_nearby_deals
+
+ITEMS = ["milk", "bread", "eggs", "cheese", "yogurt", "coffee", "apples", "chicken"]
+
+
+def main(iterations: int = 2000):
+    # Large radius so every store contributes to the result set
+    deals = find_nearby_deals(32.0850, 34.7780, ITEMS, radius=50000)
+    compact_fields = parse_fields("store,distance,item,price")
+
+    cases = {
+        # What the handler did before: plain dict through jsonable_encoder + JSONResponse
+        "baseline (JSONResponse)": lambda: JSONResponse(jsonable_encoder({"results": deals})).body,
+        # For reference only: validating through the response model as well
+        "model validated + json": lambda: json.dumps(jsonable_encoder(SearchResponse(results=deals))).encode(),
+        "fast encoder": lambda: encode_json({"results": deals}),
+        "fast encoder + fields": lambda: encode_json({"results": shape_deals(deals, compact_fields, "json")}),
+        "fast encoder + columnar": lambda: encode_json({"results": shape_deals(deals, None, "columnar")}),
+    }
+
+    print(f"{len(deals)} stores, {sum(len(d['found_items']) for d in deals)} items, {iterations} iterations")
+    for name, fn in cases.items():
+        body = fn()
+        seconds = timeit.timeit(fn, number=iterations)
+        print(f"{name:26s} {seconds / iterations * 1e6:8.1f} us/op  "
+              f"{len(body):6d} bytes  {len(gzip.compress(body, compresslevel=5)):6d} gzipped")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
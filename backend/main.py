@@ -1,14 +1,24 @@
 import json
+import math
 import os
+import threading
 from datetime import datetime, time
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from uuid import uuid4
 from pydantic import BaseModel 
 
-from models import TaskItem, LocationUpdate, User, LoginRequest, UserSettingsUpdate, ReminderConfig
+from models import TaskItem, LocationUpdate, User, LoginRequest, UserSettingsUpdate, ReminderConfig, AnyProximityResponse, AnySearchResponse
 from store_logic import find_nearby_deals, haversine_distance
+from state_lifecycle import (
+    is_location_reminder_task,
+    drop_task_state,
+    maybe_compact_geofence_state,
+    geofence_state_stats,
+)
+from request_control import RateLimiter, SingleFlight, KeyedLocks
+from response_encoding import parse_fields, parse_format, shape_deals, encoded_response, SHAPED_RESPONSE_DOC
 
 app = FastAPI()
 
@@ -47,6 +57,15 @@ users_db = load_data(USERS_FILE, {})
 tasks_db = load_data(TASKS_FILE, []) 
 geofence_state = load_data(GEOFENCE_STATE_FILE, {})
 
+# Guards whole-dict operations on geofence_state (merge, compaction, save)
+geofence_lock = threading.RLock()
+# Serializes the geofence transitions of a single user
+user_geofence_locks = KeyedLocks()
+proximity_rate_limiter = RateLimiter()
+proximity_flight = SingleFlight()
+# Checks within ~11m of each other (4 decimal places) are treated as identical
+COALESCE_COORD_PRECISION = 4
+
 class ItemSearch(BaseModel):
     latitude: float
     longitude: float
@@ -61,6 +80,7 @@ class TaskUpdate(BaseModel):
     title: Optional[str] = None
     category: Optional[str] = None
     reminder: Optional[ReminderConfig] = None
+    is_completed: Optional[bool] = None
 
 def is_within_active_time(user: dict) -> bool:
     """Check if current time is within user's active hours"""
@@ -131,9 +151,11 @@ def delete_account(req: DeleteRequest):
     tasks_db = [t for t in tasks_db if t.get('user_id') != req.username]
     save_data(TASKS_FILE, tasks_db)
     
-    if req.username in geofence_state:
-        del geofence_state[req.username]
-        save_data(GEOFENCE_STATE_FILE, geofence_state)
+    with geofence_lock:
+        if req.username in geofence_state:
+            del geofence_state[req.username]
+            save_data(GEOFENCE_STATE_FILE, geofence_state)
+    proximity_rate_limiter.forget(req.username)
 
     return {"message": "Account deleted"}
 
@@ -202,8 +224,17 @@ def update_task(task_id: str, update: TaskUpdate):
                 task['category'] = update.category
             if update.reminder:
                 task['reminder'] = update.reminder.dict()
+            if update.is_completed is not None:
+                task['is_completed'] = update.is_completed
             
             save_data(TASKS_FILE, tasks_db)
+            
+            # A new reminder or a completed task invalidates the old fence state
+            if update.reminder or task.get('is_completed', False):
+                with user_geofence_locks.hold(task.get('user_id')), geofence_lock:
+                    if drop_task_state(geofence_state, task.get('user_id'), task_id):
+                        save_data(GEOFENCE_STATE_FILE, geofence_state)
+            
             print(f"[DEBUG] Updated task {task_id}")
             return task
     
@@ -213,18 +244,56 @@ def update_task(task_id: str, update: TaskUpdate):
 def delete_task(task_id: str):
     global tasks_db
     
-    original_len = len(tasks_db)
+    deleted = [t for t in tasks_db if t['id'] == task_id]
     tasks_db = [t for t in tasks_db if t['id'] != task_id]
     
-    if len(tasks_db) == original_len:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Task not found")
         
     save_data(TASKS_FILE, tasks_db)
+    
+    with user_geofence_locks.hold(deleted[0].get('user_id')), geofence_lock:
+        if drop_task_state(geofence_state, deleted[0].get('user_id'), task_id):
+            save_data(GEOFENCE_STATE_FILE, geofence_state)
     return {"status": "deleted"}
 
 # --- PROXIMITY & REMINDERS ---
-@app.post("/check-proximity")
-def check_proximity(loc: LocationUpdate):
+# Responses are encoded by encoded_response, so the models only document the possible shapes
+@app.post(
+    "/check-proximity",
+    response_model=None,
+    responses={
+        200: {"model": AnyProximityResponse, "description": SHAPED_RESPONSE_DOC},
+        429: {"description": "Too many proximity checks for this user, see Retry-After"},
+    },
+)
+def check_proximity(loc: LocationUpdate, request: Request, fields: Optional[str] = None, output_format: Optional[str] = Query(None, alias="format")):
+    selected = parse_fields(fields)
+    layout = parse_format(output_format)
+    
+    # Unknown users are answered without creating a rate limit bucket for them
+    if loc.user_id not in users_db:
+        return encoded_response({"message": "User not found", "nearby": [], "location_reminders": []})
+    
+    allowed, retry_after = proximity_rate_limiter.check(loc.user_id)
+    if not allowed:
+        print(f"[DEBUG] Rate limited proximity check for user {loc.user_id}")
+        # A bucket that never refills has no meaningful Retry-After
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if math.isfinite(retry_after) else None
+        raise HTTPException(status_code=429, detail="Too many proximity checks", headers=headers)
+    
+    key = (
+        loc.user_id,
+        round(loc.latitude, COALESCE_COORD_PRECISION),
+        round(loc.longitude, COALESCE_COORD_PRECISION),
+    )
+    result = proximity_flight.do(key, lambda: _check_proximity(loc))
+    
+    # The result may be shared with coalesced callers, so shape a copy
+    shaped = {**result, "nearby": shape_deals(result["nearby"], selected, layout)}
+    return encoded_response(shaped, request.headers.get("accept-encoding", ""))
+
+def _check_proximity(loc: LocationUpdate):
     try:
         print(f"[DEBUG] Check proximity for user: {loc.user_id} at ({loc.latitude}, {loc.longitude})")
         
@@ -242,13 +311,23 @@ def check_proximity(loc: LocationUpdate):
         user_tasks = [t for t in tasks_db if t.get('user_id') == loc.user_id and not t.get('is_completed', False)]
         
         shopping_tasks = [t['title'] for t in user_tasks if not t.get('reminder') or t.get('reminder', {}).get('type') == 'none']
-        location_reminder_tasks = [t for t in user_tasks if t.get('reminder') and t.get('reminder', {}).get('type') in ['leaving_home', 'leaving_work', 'custom_location']]
         
         deals = []
         if shopping_tasks:
             deals = find_nearby_deals(loc.latitude, loc.longitude, shopping_tasks, radius=radius)
         
-        location_reminders = check_location_reminders(loc.user_id, loc.latitude, loc.longitude, location_reminder_tasks, user)
+        # Periodic sweep; the result is persisted by check_location_reminders
+        with geofence_lock:
+            maybe_compact_geofence_state(geofence_state, tasks_db, users_db)
+        
+        # The reminder tasks are re-read under the user's lock: update_task and delete_task
+        # drop fence state under the same lock, so a stale snapshot can't write it back
+        with user_geofence_locks.hold(loc.user_id):
+            location_reminder_tasks = [
+                t for t in tasks_db
+                if t.get('user_id') == loc.user_id and is_location_reminder_task(t)
+            ]
+            location_reminders = check_location_reminders(loc.user_id, loc.latitude, loc.longitude, location_reminder_tasks, user)
         
         print(f"[DEBUG] Found {len(deals)} deals and {len(location_reminders)} location reminders")
         
@@ -268,8 +347,10 @@ def check_location_reminders(user_id: str, lat: float, lon: float, tasks: list,
     
     reminders = []
     
-    if user_id not in geofence_state:
-        geofence_state[user_id] = {}
+    # Callers hold the user's lock, so only other users can touch geofence_state meanwhile
+    with geofence_lock:
+        prev_user_state = dict(geofence_state.get(user_id, {}))
+    new_user_state = {}
     
     for task in tasks:
         task_id = task['id']
@@ -300,12 +381,13 @@ def check_location_reminders(user_id: str, lat: float, lon: float, tasks: list,
         
         is_inside = distance <= leaving_radius
         
-        prev_state = geofence_state[user_id].get(task_id, {})
+        prev_state = prev_user_state.get(task_id, {})
         was_inside = prev_state.get('inside', False)
         
-        geofence_state[user_id][task_id] = {
+        new_user_state[task_id] = {
             'inside': is_inside,
-            'location_type': location_name
+            'location_type': location_name,
+            'updated_at': datetime.now().timestamp()
         }
         
         if was_inside and not is_inside:
@@ -320,11 +402,25 @@ def check_location_reminders(user_id: str, lat: float, lon: float, tasks: list,
         
         print(f"[DEBUG] Task '{task['title']}': distance={int(distance)}m, inside={is_inside}, was_inside={was_inside}")
     
-    save_data(GEOFENCE_STATE_FILE, geofence_state)
+    with geofence_lock:
+        geofence_state.setdefault(user_id, {}).update(new_user_state)
+        save_data(GEOFENCE_STATE_FILE, geofence_state)
     return reminders
 
-@app.post("/search-item")
-def search_item(search: ItemSearch):
+@app.get("/debug/geofence-stats")
+def get_geofence_stats():
+    with geofence_lock:
+        return geofence_state_stats(geofence_state)
+
+@app.post(
+    "/search-item",
+    response_model=None,
+    responses={200: {"model": AnySearchResponse, "description": SHAPED_RESPONSE_DOC}},
+)
+def search_item(search: ItemSearch, request: Request, fields: Optional[str] = None, output_format: Optional[str] = Query(None, alias="format")):
+    selected = parse_fields(fields)
+    layout = parse_format(output_format)
+    
     try:
         print(f"[DEBUG] Search for '{search.item_name}' at ({search.latitude}, {search.longitude}) within {search.radius}m")
         
@@ -332,7 +428,10 @@ def search_item(search: ItemSearch):
         
         print(f"[DEBUG] Search found {len(deals)} results")
         
-        return {"results": deals}
+        return encoded_response(
+            {"results": shape_deals(deals, selected, layout)},
+            request.headers.get("accept-encoding", ""),
+        )
     except Exception as e:
         print(f"[ERROR] Search item error: {e}")
         import traceback
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Literal
+from typing import Optional, Literal, Union
 
 class User(BaseModel):
     username: str
@@ -53,4 +53,77 @@ class UserSettingsUpdate(BaseModel):
     work_address: Optional[str] = None
     active_start_time: Optional[str] = None  # HH:MM format
     active_end_time: Optional[str] = None    # HH:MM format
-    notification_radius: Optional[int] = None
\ No newline at end of file
+    notification_radius: Optional[int] = None
+
+# --- RESPONSE MODELS ---
+class DealItem(BaseModel):
+    item: str
+    price: Optional[float] = None
+    brand: Optional[str] = None
+    match_score: float
+    searched_for: str
+
+class StoreDeal(BaseModel):
+    store: str
+    store_id: str
+    address: str = ""
+    lat: float
+    lon: float
+    distance: int  # in meters
+    found_items: list[DealItem]
+
+class LocationReminder(BaseModel):
+    task_id: str
+    task_title: str
+    location_type: str
+    trigger: str
+    distance: int  # in meters
+
+class ProximityResponse(BaseModel):
+    message: Optional[str] = None
+    nearby: list[StoreDeal]
+    location_reminders: list[LocationReminder]
+
+class SearchResponse(BaseModel):
+    results: list[StoreDeal]
+
+# fields= projection: every field may be left out except found_items
+class ProjectedDealItem(BaseModel):
+    item: Optional[str] = None
+    price: Optional[float] = None
+    brand: Optional[str] = None
+    match_score: Optional[float] = None
+    searched_for: Optional[str] = None
+
+class ProjectedStoreDeal(BaseModel):
+    store: Optional[str] = None
+    store_id: Optional[str] = None
+    address: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    distance: Optional[int] = None
+    found_items: list[ProjectedDealItem]
+
+# format=columnar: one list per (projected) field; items.store_index points into the store columns
+class ColumnarDeals(BaseModel):
+    stores: dict[str, list]
+    items: dict[str, list]
+
+class ProjectedProximityResponse(BaseModel):
+    message: Optional[str] = None
+    nearby: list[ProjectedStoreDeal]
+    location_reminders: list[LocationReminder]
+
+class ColumnarProximityResponse(BaseModel):
+    message: Optional[str] = None
+    nearby: ColumnarDeals
+    location_reminders: list[LocationReminder]
+
+class ProjectedSearchResponse(BaseModel):
+    results: list[ProjectedStoreDeal]
+
+class ColumnarSearchResponse(BaseModel):
+    results: ColumnarDeals
+
+AnyProximityResponse = Union[ProximityResponse, ProjectedProximityResponse, ColumnarProximityResponse]
+AnySearchResponse = Union[SearchResponse, ProjectedSearchResponse, ColumnarSearchResponse]
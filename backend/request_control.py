@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Token bucket policy for per-user rate limiting, overridable from the environment.
+# Capacity must be at least 1; a refill rate of 0 means a fixed quota that never refills.
+RATE_LIMIT_CAPACITY = float(os.environ.get("PROXIMITY_RATE_LIMIT_CAPACITY", 10))
+RATE_LIMIT_REFILL_PER_SEC = float(os.environ.get("PROXIMITY_RATE_LIMIT_REFILL_PER_SEC", 1.0))
+# Minimum time between two sweeps that evict idle (fully refilled) buckets
+RATE_LIMIT_SWEEP_INTERVAL_SECONDS = 60
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refilled(self, now: float) -> float:
+        # now may predate a freshly created bucket; never refill by a negative amount
+        elapsed = max(0.0, now - self.updated)
+        return min(self.capacity, self.tokens + elapsed * self.refill_per_sec)
+
+    def is_full(self, now: float) -> bool:
+        return self._refilled(now) >= self.capacity
+
+    def take(self, now: float) -> float:
+        """Consume one token. Returns 0 on success, otherwise seconds until a token is available."""
+        self.tokens = self._refilled(now)
+        self.updated = max(now, self.updated)
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.refill_per_sec <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.refill_per_sec
+
+
+class RateLimiter:
+    """One token bucket per key (user_id)"""
+
+    def __init__(self, capacity: float = RATE_LIMIT_CAPACITY, refill_per_sec: float = RATE_LIMIT_REFILL_PER_SEC):
+        if not capacity >= 1:
+            raise ValueError(f"Rate limit capacity (PROXIMITY_RATE_LIMIT_CAPACITY) must be >= 1, got {capacity}")
+        if not refill_per_sec >= 0:
+            raise ValueError(f"Rate limit refill (PROXIMITY_RATE_LIMIT_REFILL_PER_SEC) must be >= 0, got {refill_per_sec}")
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def check(self, key: str, now: float = None):
+        """Returns (allowed, retry_after_seconds)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last_sweep >= RATE_LIMIT_SWEEP_INTERVAL_SECONDS:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.capacity, self.refill_per_sec)
+            wait = bucket.take(now)
+        return wait == 0, wait
+
+    def forget(self, key: str):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _sweep(self, now: float):
+        # A full bucket behaves exactly like a new one, so it can be dropped
+        for key in [k for k, b in self._buckets.items() if b.is_full(now)]:
+            del self._buckets[key]
+        self._last_sweep = now
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result (or exception)"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            print(f"[DEBUG] Coalesced request for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class KeyedLocks:
+    """A lock per key, so work for one user is serialized without blocking other users"""
+
+    def __init__(self):
+        # key -> [lock, number of threads holding or waiting for it]
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._locks)
+
+    @contextmanager
+    def hold(self, key):
+        """Hold the lock for key; it is discarded once nobody holds or waits for it"""
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
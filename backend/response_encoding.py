@@ -0,0 +1,145 @@
+import gzip
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from models import StoreDeal, DealItem
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+SHAPED_RESPONSE_DOC = (
+    "Full store deals by default. With `fields=` only the listed store/item fields are "
+    "returned (found_items is always kept); with `format=columnar` the deals are sent "
+    "as one list per field."
+)
+
+
+def _model_fields(model) -> tuple:
+    fields = getattr(model, "model_fields", None) or model.__fields__
+    return tuple(fields)
+
+
+STORE_FIELDS = tuple(f for f in _model_fields(StoreDeal) if f != "found_items")
+ITEM_FIELDS = _model_fields(DealItem)
+
+
+def encode_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[set]:
+    """Parse a comma separated `fields=` projection, rejecting unknown names"""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(STORE_FIELDS) - set(ITEM_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def project_deals(deals: list, fields: Optional[set]) -> list:
+    """Keep only the requested store and item fields.
+
+    Each level is projected independently: if no field of a level is requested,
+    that level is returned whole. found_items is always kept.
+    """
+    if not fields:
+        return deals
+
+    store_keys = [f for f in STORE_FIELDS if f in fields] or list(STORE_FIELDS)
+    item_keys = [f for f in ITEM_FIELDS if f in fields] or list(ITEM_FIELDS)
+
+    return [
+        {
+            **{k: deal.get(k) for k in store_keys},
+            "found_items": [{k: item.get(k) for k in item_keys} for item in deal["found_items"]],
+        }
+        for deal in deals
+    ]
+
+
+def to_columnar(deals: list, fields: Optional[set] = None) -> dict:
+    """Column-per-field layout; items point back to their store via store_index"""
+    store_keys = [f for f in STORE_FIELDS if not fields or f in fields] or list(STORE_FIELDS)
+    item_keys = [f for f in ITEM_FIELDS if not fields or f in fields] or list(ITEM_FIELDS)
+
+    stores = {k: [] for k in store_keys}
+    items = {"store_index": [], **{k: [] for k in item_keys}}
+
+    for i, deal in enumerate(deals):
+        for k in store_keys:
+            stores[k].append(deal.get(k))
+        for item in deal["found_items"]:
+            items["store_index"].append(i)
+            for k in item_keys:
+                items[k].append(item.get(k))
+
+    return {"stores": stores, "items": items}
+
+
+def parse_format(output_format: Optional[str]) -> str:
+    if output_format in (None, "", "json"):
+        return "json"
+    if output_format == "columnar":
+        return output_format
+    raise HTTPException(status_code=400, detail=f"Unknown format: {output_format}")
+
+
+def shape_deals(deals: list, fields: Optional[set], output_format: str):
+    """Apply a parsed `fields=` projection and `format=` layout to a list of store deals"""
+    if output_format == "columnar":
+        return to_columnar(deals, fields)
+    return project_deals(deals, fields)
+
+
+def _pick_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def encoded_response(data, accept_encoding: str = "", status_code: int = 200) -> Response:
+    """Serialize with the fast encoder and compress large bodies if the client accepts it"""
+    body = encode_json(data)
+    headers = {"Vary": "Accept-Encoding"}
+
+    if len(body) >= MIN_COMPRESS_BYTES:
+        encoding = _pick_encoding(accept_encoding)
+        if encoding == "br":
+            body = brotli.compress(body, quality=4)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=5)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
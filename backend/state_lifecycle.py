@@ -0,0 +1,113 @@
+import json
+import sys
+import time
+
+# Fence entries that have not been refreshed by a proximity check for this long are dropped
+GEOFENCE_STATE_TTL_SECONDS = 7 * 24 * 3600
+# Minimum time between two compaction sweeps
+COMPACTION_INTERVAL_SECONDS = 10 * 60
+
+LOCATION_REMINDER_TYPES = ['leaving_home', 'leaving_work', 'custom_location']
+
+_last_compaction = 0.0
+_last_compaction_removed = 0
+
+
+def is_location_reminder_task(task: dict) -> bool:
+    """True if the task is open and has a location-based reminder"""
+    if task.get('is_completed', False):
+        return False
+    reminder = task.get('reminder') or {}
+    return reminder.get('type') in LOCATION_REMINDER_TYPES
+
+
+def drop_task_state(geofence_state: dict, user_id: str, task_id: str) -> bool:
+    """Forget the fence state of a single task. Returns True if anything was removed."""
+    user_state = geofence_state.get(user_id)
+    if not user_state or task_id not in user_state:
+        return False
+
+    del user_state[task_id]
+    if not user_state:
+        del geofence_state[user_id]
+
+    print(f"[DEBUG] Dropped geofence state for task {task_id} of user {user_id}")
+    return True
+
+
+def compact_geofence_state(geofence_state: dict, tasks_db: list, users_db: dict, now: float = None) -> int:
+    """Remove fence entries of unknown users, closed or retyped tasks and expired entries.
+
+    Returns the number of task entries removed.
+    """
+    global _last_compaction, _last_compaction_removed
+
+    now = time.time() if now is None else now
+    live_tasks = {t['id']: t for t in tasks_db if t.get('id')}
+    removed = 0
+
+    for user_id in list(geofence_state.keys()):
+        user_state = geofence_state[user_id]
+
+        if user_id not in users_db or not isinstance(user_state, dict):
+            removed += len(user_state) if isinstance(user_state, dict) else 0
+            del geofence_state[user_id]
+            continue
+
+        for task_id in list(user_state.keys()):
+            entry = user_state[task_id]
+            task = live_tasks.get(task_id)
+
+            # Entries written before timestamps existed start their TTL at this sweep
+            if isinstance(entry, dict) and 'updated_at' not in entry:
+                entry['updated_at'] = now
+            updated_at = entry.get('updated_at', 0) if isinstance(entry, dict) else 0
+
+            if (task is None
+                    or task.get('user_id') != user_id
+                    or not is_location_reminder_task(task)
+                    or now - updated_at > GEOFENCE_STATE_TTL_SECONDS):
+                del user_state[task_id]
+                removed += 1
+
+        if not user_state:
+            del geofence_state[user_id]
+
+    _last_compaction = now
+    _last_compaction_removed = removed
+
+    if removed:
+        print(f"[DEBUG] Geofence compaction removed {removed} stale entries")
+    return removed
+
+
+def maybe_compact_geofence_state(geofence_state: dict, tasks_db: list, users_db: dict, now: float = None) -> int:
+    """Run a compaction sweep if the last one is older than COMPACTION_INTERVAL_SECONDS"""
+    now = time.time() if now is None else now
+    if now - _last_compaction < COMPACTION_INTERVAL_SECONDS:
+        return 0
+    return compact_geofence_state(geofence_state, tasks_db, users_db, now=now)
+
+
+def _deep_sizeof(obj) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_sizeof(v) for v in obj)
+    return size
+
+
+def geofence_state_stats(geofence_state: dict) -> dict:
+    """Size and memory figures for monitoring geofence state growth"""
+    entries = sum(len(s) for s in geofence_state.values() if isinstance(s, dict))
+    return {
+        'users': len(geofence_state),
+        'entries': entries,
+        'memory_bytes': _deep_sizeof(geofence_state),
+        'serialized_bytes': len(json.dumps(geofence_state, indent=4)),
+        'ttl_seconds': GEOFENCE_STATE_TTL_SECONDS,
+        'compaction_interval_seconds': COMPACTION_INTERVAL_SECONDS,
+        'last_compaction': _last_compaction or None,
+        'last_compaction_removed': _last_compaction_removed,
+    }
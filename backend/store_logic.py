@@ -64,7 +64,9 @@ def find_nearby_deals(user_lat, user_lon, user_items, radius=500):
                     if score > 0.2:  # Lowered from 0.3 for better matching
                         matched_product = inventory[best_match_idx]
                         found_items.append({
-                            **matched_product,
+                            "item": matched_product["item"],
+                            "price": matched_product.get("price"),
+                            "brand": matched_product.get("brand"),
                             "match_score": float(score),
                             "searched_for": user_item
                         })
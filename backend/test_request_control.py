@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+from request_control import TokenBucket, RateLimiter, SingleFlight, KeyedLocks
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(capacity=2, refill_per_sec=1)
+    now = bucket.updated
+
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == pytest.approx(1.0)
+
+    # Half a second refills half a token, a full second refills one
+    assert bucket.take(now + 0.5) == pytest.approx(0.5)
+    assert bucket.take(now + 1.0) == 0
+
+
+def test_rate_limiter_evicts_full_buckets():
+    limiter = RateLimiter(capacity=2, refill_per_sec=1)
+    start = time.monotonic()
+
+    for i in range(5):
+        limiter.check(f"user{i}", now=start)
+    assert len(limiter) == 5
+
+    limiter.check("other", now=start + 3600)
+    assert len(limiter) == 1
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    leader.start()
+    started.wait(5)
+
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    # Give the followers time to join the in-flight call
+    time.sleep(0.1)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == ["result"] * 5
+
+
+def test_single_flight_error_reaches_every_caller():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def work():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("k", work)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(3)]
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(errors) == 4
+
+
+def test_keyed_locks_are_discarded_when_released():
+    locks = KeyedLocks()
+    with locks.hold("a"):
+        assert len(locks) == 1
+    assert len(locks) == 0
+
+
+def test_check_proximity_rate_limit_sets_retry_after(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("sklearn")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.chdir(tmp_path)
+    import main
+
+    monkeypatch.setitem(main.users_db, "limited", {"username": "limited", "password": "p"})
+    monkeypatch.setattr(main, "proximity_rate_limiter", RateLimiter(capacity=1, refill_per_sec=0.5))
+    client = TestClient(main.app)
+    body = {"latitude": 32.0, "longitude": 34.0, "user_id": "limited"}
+
+    assert client.post("/check-proximity", json=body).status_code == 200
+
+    response = client.post("/check-proximity", json=body)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+
+def test_check_proximity_without_refill_omits_retry_after(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("sklearn")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.chdir(tmp_path)
+    import main
+
+    monkeypatch.setitem(main.users_db, "quota", {"username": "quota", "password": "p"})
+    monkeypatch.setattr(main, "proximity_rate_limiter", RateLimiter(capacity=1, refill_per_sec=0))
+    client = TestClient(main.app)
+    body = {"latitude": 32.0, "longitude": 34.0, "user_id": "quota"}
+
+    assert client.post("/check-proximity", json=body).status_code == 200
+
+    response = client.post("/check-proximity", json=body)
+    assert response.status_code == 429
+    assert "Retry-After" not in response.headers
+
+
+@pytest.mark.parametrize("capacity, refill_per_sec", [(0.5, 1), (0, 1), (-1, 1), (10, -1)])
+def test_rate_limiter_rejects_invalid_policy(capacity, refill_per_sec):
+    with pytest.raises(ValueError):
+        RateLimiter(capacity=capacity, refill_per_sec=refill_per_sec)
@@ -0,0 +1,83 @@
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from models import SearchResponse, ProjectedSearchResponse, ColumnarSearchResponse
+from response_encoding import parse_fields, shape_deals, encoded_response, MIN_COMPRESS_BYTES
+
+DEALS = [
+    {
+        "store": "Tiv Taam Dizengoff",
+        "store_id": "5",
+        "address": "Dizengoff St 189, Tel Aviv",
+        "lat": 32.085,
+        "lon": 34.778,
+        "distance": 0,
+        "found_items": [
+            {"item": "organic milk", "price": 9.9, "brand": "Strauss Organic", "match_score": 0.7, "searched_for": "milk"},
+            {"item": "eggs", "price": 18.9, "brand": "Free range dozen", "match_score": 1.0, "searched_for": "eggs"},
+        ],
+    },
+]
+
+
+def _validate(model, data):
+    return model.model_validate(data) if hasattr(model, "model_validate") else model.parse_obj(data)
+
+
+def test_default_shape_matches_model():
+    _validate(SearchResponse, {"results": shape_deals(DEALS, None, "json")})
+
+
+def test_projection_matches_model():
+    shaped = shape_deals(DEALS, parse_fields("store,price"), "json")
+    assert shaped == [{"store": "Tiv Taam Dizengoff", "found_items": [{"price": 9.9}, {"price": 18.9}]}]
+    _validate(ProjectedSearchResponse, {"results": shaped})
+
+
+def test_columnar_matches_model():
+    shaped = shape_deals(DEALS, parse_fields("distance,item"), "columnar")
+    assert shaped == {
+        "stores": {"distance": [0]},
+        "items": {"store_index": [0, 0], "item": ["organic milk", "eggs"]},
+    }
+    _validate(ColumnarSearchResponse, {"results": shaped})
+
+
+def test_unknown_field_is_rejected():
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("store,bogus")
+    assert exc.value.status_code == 400
+
+
+def test_large_bodies_are_gzipped_when_accepted():
+    data = {"results": DEALS * 20}
+    assert len(json.dumps(data)) > MIN_COMPRESS_BYTES
+
+    response = encoded_response(data, "gzip, br;q=0")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body)) == data
+
+    assert "Content-Encoding" not in encoded_response(data, "").headers
+
+
+def test_search_item_format_query_parameter(tmp_path, monkeypatch):
+    pytest.importorskip("sklearn")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.chdir(tmp_path)
+    import main
+
+    client = TestClient(main.app)
+    body = {"latitude": 32.085, "longitude": 34.778, "item_name": "milk", "radius": 1000}
+
+    response = client.post("/search-item?format=columnar&fields=store,item", json=body)
+    assert response.status_code == 200
+    assert set(response.json()["results"]) == {"stores", "items"}
+
+    assert client.post("/search-item?format=bogus", json=body).status_code == 400
@@ -0,0 +1,104 @@
+import pytest
+
+import state_lifecycle
+from state_lifecycle import (
+    GEOFENCE_STATE_TTL_SECONDS,
+    COMPACTION_INTERVAL_SECONDS,
+    drop_task_state,
+    compact_geofence_state,
+    maybe_compact_geofence_state,
+)
+
+NOW = 1_000_000.0
+USERS = {"u": {}, "other": {}}
+
+
+def _task(task_id, user_id="u", reminder_type="leaving_home", **extra):
+    return {"id": task_id, "user_id": user_id, "reminder": {"type": reminder_type}, **extra}
+
+
+def _entry(updated_at=NOW):
+    return {"inside": True, "location_type": "home", "updated_at": updated_at}
+
+
+def test_compaction_removes_stale_entries():
+    tasks = [
+        _task("live"),
+        _task("foreign", user_id="other"),
+        _task("completed", is_completed=True),
+        _task("retyped", reminder_type="specific_time"),
+        _task("expired"),
+    ]
+    state = {
+        "u": {
+            "live": _entry(),
+            "deleted": _entry(),
+            "foreign": _entry(),
+            "completed": _entry(),
+            "retyped": _entry(),
+            "expired": _entry(NOW - GEOFENCE_STATE_TTL_SECONDS - 1),
+        },
+        "ghost": {"live": _entry()},
+    }
+
+    removed = compact_geofence_state(state, tasks, USERS, now=NOW)
+
+    assert removed == 6
+    assert state == {"u": {"live": _entry()}}
+
+
+def test_legacy_entry_is_stamped_then_expires():
+    tasks = [_task("t")]
+    state = {"u": {"t": {"inside": True}}}
+
+    compact_geofence_state(state, tasks, USERS, now=NOW)
+    assert state["u"]["t"]["updated_at"] == NOW
+
+    compact_geofence_state(state, tasks, USERS, now=NOW + GEOFENCE_STATE_TTL_SECONDS)
+    assert "t" in state["u"]
+
+    compact_geofence_state(state, tasks, USERS, now=NOW + GEOFENCE_STATE_TTL_SECONDS + 1)
+    assert state == {}
+
+
+def test_drop_task_state_removes_empty_user():
+    state = {"u": {"a": _entry(), "b": _entry()}}
+
+    assert drop_task_state(state, "u", "a")
+    assert state == {"u": {"b": _entry()}}
+    assert drop_task_state(state, "u", "b")
+    assert state == {}
+    assert not drop_task_state(state, "u", "b")
+
+
+def test_maybe_compact_respects_interval(monkeypatch):
+    monkeypatch.setattr(state_lifecycle, "_last_compaction", NOW)
+    state = {"ghost": {"t": _entry()}}
+
+    assert maybe_compact_geofence_state(state, [], USERS, now=NOW + COMPACTION_INTERVAL_SECONDS - 1) == 0
+    assert "ghost" in state
+
+    assert maybe_compact_geofence_state(state, [], USERS, now=NOW + COMPACTION_INTERVAL_SECONDS) == 1
+    assert state == {}
+
+
+@pytest.mark.parametrize("method", ["complete", "delete"])
+def test_task_endpoints_clear_fence_state(method, tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("sklearn")
+    from fastapi.testclient import TestClient
+
+    monkeypatch.chdir(tmp_path)
+    import main
+
+    monkeypatch.setattr(main, "tasks_db", [_task("t1", title="keys", category="x")])
+    monkeypatch.setattr(main, "geofence_state", {"u": {"t1": _entry()}})
+    client = TestClient(main.app)
+
+    if method == "complete":
+        response = client.put("/tasks/t1", json={"is_completed": True})
+    else:
+        response = client.delete("/tasks/t1")
+
+    assert response.status_code == 200
+    assert main.geofence_state == {}